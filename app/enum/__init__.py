@@ -1,6 +1,7 @@
 from .tools import (
     ffuf_fuzz,
     whatweb_scan,
+    whatweb_scan_native,
     gobuster_dir,
 )
 
@@ -8,6 +9,7 @@ from .tools import (
 def register(mcp):
     mcp.tool(name="enum.ffuf_fuzz")(ffuf_fuzz)
     mcp.tool(name="enum.whatweb_scan")(whatweb_scan)
+    mcp.tool(name="enum.whatweb_scan_native")(whatweb_scan_native)
     mcp.tool(name="enum.gobuster_dir")(gobuster_dir)
 
 
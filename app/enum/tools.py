@@ -1,25 +1,115 @@
 import os
-from typing import Dict, Any
+import re
+from contextlib import aclosing
+from typing import Dict, Any, List, Optional
+
+import httpx
+from fastmcp import Context
 
 from app.tools import (
     run_cmd_capture,
+    run_cmd_stream,
     run_in_docker,
-    parse_ffuf_json,
-    make_job_tmpdir,
-    cleanup_tmpdir,
+    run_in_docker_stream,
+    iter_ffuf_results,
+    report_event,
+    make_raw_output_path,
+    OutputLimitExceeded,
+    CMD_STDOUT_CAP,
+    maybe_tmpdir,
+    response_cache,
+    iter_line_chunks,
+    load_docker_profile,
 )
 from app.models import (
-    FfufParams,
-    WhatwebParams,
-    GobusterParams,
+    FFUF_VALIDATOR,
+    WHATWEB_VALIDATOR,
+    GOBUSTER_VALIDATOR,
 )
 
+FFUF_DOCKER = load_docker_profile("FFUF", "ffuf:latest")
+WHATWEB_DOCKER = load_docker_profile("WHATWEB", "whatweb:latest")
+GOBUSTER_DOCKER = load_docker_profile("GOBUSTER", "gobuster:latest")
+# results kept per ffuf job; past it ffuf is killed and the response is marked truncated
+FFUF_MAX_RESULTS = int(os.getenv("FFUF_MAX_RESULTS", "10000"))
+
+_GOBUSTER_RE = re.compile(rb"^(/\S+)\s+\(Status:\s*(\d+)\)", re.M)
+
+
+def _parse_gobuster(out: bytes) -> List[Dict[str, Any]]:
+    return [
+        {"path": m.group(1).decode(errors="ignore"), "status": int(m.group(2))}
+        for chunk in iter_line_chunks(out)
+        for m in _GOBUSTER_RE.finditer(chunk)
+    ]
+
+
+# Shared client for in-process fingerprinting: keeps TCP/TLS connections (and HTTP/2) alive
+# across calls instead of starting a WhatWeb ruby process per target.
+_HTTP = httpx.AsyncClient(
+    http2=True,
+    verify=False,
+    follow_redirects=True,
+    timeout=30.0,
+    limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+    headers={"User-Agent": "Mozilla/5.0 (compatible; mcp-appsec)"},
+)
+WHATWEB_NATIVE_BODY_CAP = 512 * 1024
 
-async def ffuf_fuzz(params: Dict[str, Any]) -> Dict[str, Any]:
+# Wappalyzer-style signatures, compiled once: matched against the body (bytes)
+# and against Set-Cookie / X-Powered-By / Server values (str).
+_BODY_SIGNATURES = {
+    name: re.compile(pattern, re.I)
+    for name, pattern in {
+        "WordPress": rb"/wp-content/|/wp-includes/|<meta[^>]+generator[^>]+WordPress",
+        "Joomla": rb"<meta[^>]+generator[^>]+Joomla|/media/jui/|/components/com_",
+        "Drupal": rb"<meta[^>]+generator[^>]+Drupal|/sites/default/files/|Drupal\.settings",
+        "Magento": rb"/skin/frontend/|Mage\.Cookies|/static/version\d+/frontend/",
+        "Shopify": rb"cdn\.shopify\.com|Shopify\.theme",
+        "Ghost": rb"<meta[^>]+generator[^>]+Ghost",
+        "MediaWiki": rb"<meta[^>]+generator[^>]+MediaWiki|/load\.php\?.*modules=",
+        "Confluence": rb"ajs-version-number|com-atlassian-confluence",
+        "Jenkins": rb"<title>[^<]*Jenkins|/static/[0-9a-f]{8}/jsbundles/",
+        "GitLab": rb"<meta[^>]+content=\"GitLab\"|gon\.gitlab_url",
+        "phpMyAdmin": rb"<title>phpMyAdmin|pma_navigation",
+        "Grafana": rb"<title>Grafana</title>|grafanaBootData",
+        "Kibana": rb"<title>Kibana</title>|kbn-injected-metadata",
+        "Tomcat": rb"<title>Apache Tomcat",
+        "Next.js": rb"__NEXT_DATA__|/_next/static/",
+        "Nuxt.js": rb"window\.__NUXT__|/_nuxt/",
+        "React": rb"data-reactroot|react-dom(\.production)?(\.min)?\.js",
+        "Angular": rb"ng-version=|ng-app=",
+        "Vue.js": rb"data-v-[0-9a-f]{8}|vue(\.min)?\.js",
+        "jQuery": rb"jquery[.-]?(\d[\d.]*)?(\.min)?\.js",
+        "Bootstrap": rb"bootstrap(\.min)?\.(css|js)",
+        "Laravel": rb"laravel_session|<meta name=\"csrf-token\"",
+        "Django": rb"csrfmiddlewaretoken|__admin_media_prefix__",
+    }.items()
+}
+_HEADER_SIGNATURES = {
+    name: re.compile(pattern, re.I)
+    for name, pattern in {
+        "PHP": r"PHPSESSID|\bPHP/?",
+        "ASP.NET": r"ASP\.NET|ASPSESSIONID|\.ASPXAUTH",
+        "Java": r"JSESSIONID|Servlet|JSP/",
+        "Express": r"\bExpress\b|connect\.sid",
+        "Laravel": r"laravel_session|XSRF-TOKEN",
+        "Django": r"csrftoken|django",
+        "Rails": r"_session_id|Phusion Passenger",
+        "WordPress": r"wordpress_|wp-settings-",
+        "Nginx": r"\bnginx\b",
+        "Apache": r"\bApache\b",
+        "IIS": r"Microsoft-IIS",
+        "Cloudflare": r"cloudflare|__cf_bm|__cfduid",
+    }.items()
+}
+
+
+async def ffuf_fuzz(params: Dict[str, Any], ctx: Optional[Context] = None) -> Dict[str, Any]:
     """
     Web fuzzing using ffuf. params must follow FfufParams schema.
     Quét thư mục/đường dẫn web bằng ffuf và trả kết quả ở dạng JSON.
-    Returns parsed JSON (if -of json) in 'ffuf' key, plus stdout/stderr.
+    Output of `ffuf -json` is parsed as it streams; compact results go in the 'ffuf' key.
     Tìm kiếm đường dẫn/ứng dụng ẩn (directory / file) trên 1 URL bằng wordlist.
 
     MỤC ĐÍCH:
@@ -30,16 +120,20 @@ async def ffuf_fuzz(params: Dict[str, Any]) -> Dict[str, Any]:
       - Trước khi bắt đầu fuzz sâu hoặc manual testing.
 
     THAM SỐ (theo FfufParams):
-      - url (str, bắt buộc): URL chứa token FUZZ, ví dụ "http://target/FUZZ"
+      - url (str, bắt buộc nếu không dùng hosts): URL chứa token FUZZ, ví dụ "http://target/FUZZ"
       - wordlist (str): đường dẫn tới wordlist
       - threads (int): số luồng đồng thời
       - timeout_s (int): timeout tổng cho job (giây)
-      - store_raw (bool): nếu true thì trả thêm stdout thô
+      - store_raw (bool): nếu true thì ghi stdout thô ra file và trả đường dẫn
+      - hosts (list[str]): chế độ batch, danh sách base URL; tất cả chạy trong MỘT process ffuf
+      - url_template (str): URL chứa HOST và FUZZ cho chế độ batch (mặc định "HOST/FUZZ")
 
     ĐẦU RA:
       - success: bool
-      - ffuf: dict (JSON parse từ ffuf -of json)
-      - stdout: (tuỳ) raw output nếu store_raw=True
+      - ffuf: {"results": [{"url", "status", "length", "words"}, ...]} (stream-parse từ ffuf -json)
+      - truncated: (tuỳ) true nếu đạt FFUF_MAX_RESULTS; ffuf bị dừng, results chỉ gồm phần đã thu
+      - stdout_path: (tuỳ) file chứa raw output nếu store_raw=True (trong RAW_OUTPUT_DIR,
+        tự xoá sau RAW_OUTPUT_RETENTION giây)
       - stderr: lỗi nếu có
 
     VÍ DỤ GỌI:
@@ -49,49 +143,90 @@ async def ffuf_fuzz(params: Dict[str, Any]) -> Dict[str, Any]:
         "threads": 40,
         "timeout_s": 120
       })
+      ffuf_fuzz({
+        "hosts": ["http://10.10.10.5", "http://10.10.10.6"],
+        "url_template": "HOST/FUZZ",
+        "wordlist": "/opt/SecLists/Discovery/Web-Content/common.txt"
+      })
 
     GHI CHÚ:
       - Luôn kiểm tra host trong URL với ALLOWED_PREFIX trước khi chạy.
       - ffuf có thể tạo nhiều request: set resource limits (threads, timeout).
       - Nếu kết quả quá lớn, lưu raw output vào storage (S3/MinIO) và trả pointer thay vì chèn toàn bộ vào JSON.
+      - Mỗi result được đẩy ngay về client (JSON line trong MCP progress notification) khi ffuf tìm thấy,
+        không cần chờ hết job.
     """
     try:
-        p = FfufParams(**params)
+        p = FFUF_VALIDATOR.validate_python(params)
     except Exception as e:
         return {"success": False, "error": f"invalid params: {e}"}
 
-    tmp = make_job_tmpdir()
-    try:
-        cmd = ["ffuf", "-u", p.url, "-w", p.wordlist, "-t", str(p.threads), "-of", "json", "-o", "-"]
-        use_docker = os.getenv("FFUF_USE_DOCKER", "false").lower() in {"1", "true", "yes"}
-        if use_docker:
-            image = os.getenv("FFUF_DOCKER_IMAGE", "ffuf:latest")
-            network_mode = os.getenv("FFUF_DOCKER_NETWORK", None)
-            caps_env = os.getenv("FFUF_DOCKER_CAPS", "")
-            cap_add = [c.strip() for c in caps_env.split(",") if c.strip()]
-            rc, out, err = await run_in_docker(
-                image=image,
+    if p.hosts:
+        template = p.url_template or "HOST/FUZZ"
+        if "HOST" not in template or "FUZZ" not in template:
+            return {"success": False, "error": "invalid params: url_template must contain HOST and FUZZ"}
+    elif not p.url:
+        return {"success": False, "error": "invalid params: url or hosts is required"}
+
+    # only the batched-hosts path writes a file (hosts.txt) into the job tmpdir
+    async with maybe_tmpdir(bool(p.hosts)) as tmp:
+        mounts = None
+        if p.hosts:
+            hosts_file = os.path.join(tmp, "hosts.txt")
+            with open(hosts_file, "w") as f:
+                f.write("\n".join(h.rstrip("/") for h in p.hosts) + "\n")
+            mounts = [(tmp, tmp)]
+            cmd = [
+                "ffuf",
+                "-w", f"{hosts_file}:HOST",
+                "-w", f"{p.wordlist}:FUZZ",
+                "-u", template,
+                "-t", str(p.threads),
+                "-json",
+            ]
+        else:
+            cmd = ["ffuf", "-u", p.url, "-w", p.wordlist, "-t", str(p.threads), "-json"]
+
+        # raw output is only kept when asked for, and then on disk rather than in memory
+        raw_path = make_raw_output_path("ffuf", "jsonl") if p.store_raw else None
+
+        async def consume(stream):
+            results = []
+            async with aclosing(iter_ffuf_results(stream, raw_path=raw_path)) as items:
+                async for item in items:
+                    if len(results) >= FFUF_MAX_RESULTS:
+                        raise OutputLimitExceeded(results)
+                    results.append(item)
+                    await report_event(ctx, len(results), item)
+            return results
+
+        if FFUF_DOCKER.use:
+            rc, results, err, truncated = await run_in_docker_stream(
+                image=FFUF_DOCKER.image,
                 cmd=cmd,
-                mounts=None,
+                consume=consume,
+                mounts=mounts,
                 timeout=p.timeout_s,
-                network_mode=network_mode,
-                cap_add=cap_add,
+                network_mode=FFUF_DOCKER.network,
+                cap_add=list(FFUF_DOCKER.caps),
             )
         else:
-            rc, out, err = await run_cmd_capture(cmd, timeout=p.timeout_s)
-        if rc == -1:
-            return {"success": False, "error": "timeout"}
-        if rc != 0 and not out:
-            return {"success": False, "stderr": err[:2000]}
-        payload = parse_ffuf_json(out)
-        res = {"success": True, "ffuf": payload}
-        if p.store_raw:
-            res["stdout"] = out
+            rc, results, err, truncated = await run_cmd_stream(cmd, consume, timeout=p.timeout_s)
+        if rc == -1 or (rc != 0 and not results):
+            if raw_path and os.path.exists(raw_path):
+                os.unlink(raw_path)
+            if rc == -1:
+                return {"success": False, "error": "timeout"}
+            return {"success": False, "stderr": err[:2000].decode(errors="ignore")}
+        res = {"success": True, "ffuf": {"results": results}}
+        if truncated:
+            res["truncated"] = True
+        if raw_path:
+            res["stdout_path"] = raw_path
         return res
-    finally:
-        cleanup_tmpdir(tmp)
 
 
+@response_cache("whatweb")
 async def whatweb_scan(params: Dict[str, Any]) -> Dict[str, Any]:
     """
     Thu thập fingerprint ứng dụng web (server, CMS, headers) bằng WhatWeb.
@@ -111,6 +246,7 @@ async def whatweb_scan(params: Dict[str, Any]) -> Dict[str, Any]:
       - success: bool
       - stdout: raw WhatWeb output (parse tuỳ phiên bản)
       - stderr: nếu có lỗi
+      - truncated: (tuỳ) true nếu output vượt CMD_STDOUT_CAP và bị cắt
 
     VÍ DỤ:
       whatweb_scan({"target": "http://10.10.10.5", "timeout_s": 20})
@@ -120,62 +256,171 @@ async def whatweb_scan(params: Dict[str, Any]) -> Dict[str, Any]:
       - Không gây thao tác destructive.
     """
     try:
-        p = WhatwebParams(**params)
+        p = WHATWEB_VALIDATOR.validate_python(params)
     except Exception as e:
         return {"success": False, "error": f"invalid params: {e}"}
 
     cmd = ["whatweb", "-a", "2", p.target]
-    use_docker = os.getenv("WHATWEB_USE_DOCKER", "false").lower() in {"1", "true", "yes"}
-    if use_docker:
-        image = os.getenv("WHATWEB_DOCKER_IMAGE", "whatweb:latest")
-        network_mode = os.getenv("WHATWEB_DOCKER_NETWORK", None)
-        caps_env = os.getenv("WHATWEB_DOCKER_CAPS", "")
-        cap_add = [c.strip() for c in caps_env.split(",") if c.strip()]
-        rc, out, err = await run_in_docker(
-            image=image, cmd=cmd, mounts=None, timeout=p.timeout_s, network_mode=network_mode, cap_add=cap_add
+    if WHATWEB_DOCKER.use:
+        rc, out, err, truncated = await run_in_docker(
+            image=WHATWEB_DOCKER.image,
+            cmd=cmd,
+            mounts=None,
+            timeout=p.timeout_s,
+            network_mode=WHATWEB_DOCKER.network,
+            cap_add=list(WHATWEB_DOCKER.caps),
         )
     else:
-        rc, out, err = await run_cmd_capture(cmd, timeout=p.timeout_s)
+        rc, out, err, truncated = await run_cmd_capture(cmd, timeout=p.timeout_s)
     if rc == -1:
         return {"success": False, "error": "timeout"}
     if rc != 0 and not out:
-        return {"success": False, "stderr": err[:2000]}
-    return {"success": True, "stdout": out}
+        return {"success": False, "stderr": err[:2000].decode(errors="ignore")}
+    res = {"success": True, "stdout": out.decode(errors="ignore")}
+    if truncated:
+        res["truncated"] = True
+    return res
 
 
-async def gobuster_dir(params: Dict[str, Any]) -> Dict[str, Any]:
+async def whatweb_scan_native(params: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Run gobuster dir mode. Returns raw stdout and simple parse of found paths.
+    Fingerprint nhanh ứng dụng web trong process (không gọi WhatWeb): một request GET "/" qua
+    httpx client dùng chung (HTTP/2, keep-alive), trích header và so khớp chữ ký CMS/framework.
+
+    MỤC ĐÍCH:
+      - Nhận diện server, ngôn ngữ/framework, CMS phổ biến với chi phí một round trip HTTP.
+
+    KHI NÀO DÙNG:
+      - Fingerprint hàng loạt host; cần chi tiết plugin/version sâu hơn thì dùng whatweb_scan.
+
+    THAM SỐ (theo WhatwebParams):
+      - target (str, bắt buộc): URL hoặc host (không có scheme thì dùng http://)
+      - timeout_s (int): timeout cho request
+
+    ĐẦU RA:
+      - success: bool
+      - url: URL cuối cùng (sau redirect), status, http_version
+      - server, x_powered_by: giá trị header (nếu có)
+      - set_cookie: list giá trị Set-Cookie
+      - technologies: list tên công nghệ khớp chữ ký
+      - error: nếu lỗi kết nối / timeout
+
+    VÍ DỤ:
+      whatweb_scan_native({"target": "http://10.10.10.5", "timeout_s": 10})
+
+    GHI CHÚ:
+      - Không verify TLS; chỉ đọc tối đa WHATWEB_NATIVE_BODY_CAP byte body.
+      - Không gây thao tác destructive.
     """
     try:
-        p = GobusterParams(**params)
+        p = WHATWEB_VALIDATOR.validate_python(params)
     except Exception as e:
         return {"success": False, "error": f"invalid params: {e}"}
 
-    tmp = make_job_tmpdir()
+    url = p.target if "://" in p.target else f"http://{p.target}"
     try:
-        cmd = ["gobuster", "dir", "-u", p.url, "-w", p.wordlist, "-t", str(p.threads), "-q"]
-        use_docker = os.getenv("GOBUSTER_USE_DOCKER", "false").lower() in {"1", "true", "yes"}
-        if use_docker:
-            image = os.getenv("GOBUSTER_DOCKER_IMAGE", "gobuster:latest")
-            network_mode = os.getenv("GOBUSTER_DOCKER_NETWORK", None)
-            caps_env = os.getenv("GOBUSTER_DOCKER_CAPS", "")
-            cap_add = [c.strip() for c in caps_env.split(",") if c.strip()]
-            rc, out, err = await run_in_docker(
-                image=image, cmd=cmd, mounts=None, timeout=p.timeout_s, network_mode=network_mode, cap_add=cap_add
-            )
-        else:
-            rc, out, err = await run_cmd_capture(cmd, timeout=p.timeout_s)
-        if rc == -1:
-            return {"success": False, "error": "timeout"}
-        if rc != 0 and not out:
-            return {"success": False, "stderr": err[:2000]}
-        found = []
-        for line in out.splitlines():
-            if line.strip() and (line.startswith("/") or "Status:" in line):
-                found.append(line.strip())
-        return {"success": True, "stdout": out, "found": found}
-    finally:
-        cleanup_tmpdir(tmp)
+        async with _HTTP.stream("GET", url, timeout=p.timeout_s) as resp:
+            body = bytearray()
+            async for chunk in resp.aiter_bytes():
+                body += chunk
+                if len(body) >= WHATWEB_NATIVE_BODY_CAP:
+                    break
+    except httpx.TimeoutException:
+        return {"success": False, "error": "timeout"}
+    except httpx.HTTPError as e:
+        return {"success": False, "error": f"{type(e).__name__}: {e}"}
+
+    server = resp.headers.get("server")
+    powered_by = resp.headers.get("x-powered-by")
+    cookies = resp.headers.get_list("set-cookie")
+    header_text = "\n".join(filter(None, [server, powered_by, *cookies]))
+    technologies: List[str] = [name for name, rx in _HEADER_SIGNATURES.items() if rx.search(header_text)]
+    for name, rx in _BODY_SIGNATURES.items():
+        if name not in technologies and rx.search(body):
+            technologies.append(name)
+    return {
+        "success": True,
+        "url": str(resp.url),
+        "status": resp.status_code,
+        "http_version": resp.http_version,
+        "server": server,
+        "x_powered_by": powered_by,
+        "set_cookie": cookies,
+        "technologies": technologies,
+    }
+
+
+async def gobuster_dir(params: Dict[str, Any], ctx: Optional[Context] = None) -> Dict[str, Any]:
+    """
+    Run gobuster dir mode. Returns raw stdout and found paths as {path, status}.
+    With "hosts" (list of base URLs) the scan is dispatched to a single batched ffuf
+    process, since gobuster has no multi-keyword mode.
+    Each found path is pushed to the client as a progress notification event as soon as gobuster prints it.
+    """
+    try:
+        p = GOBUSTER_VALIDATOR.validate_python(params)
+    except Exception as e:
+        return {"success": False, "error": f"invalid params: {e}"}
+
+    if p.hosts:
+        res = await ffuf_fuzz({
+            "hosts": p.hosts,
+            "url_template": "HOST/FUZZ",
+            "wordlist": p.wordlist,
+            "threads": p.threads,
+            "timeout_s": p.timeout_s,
+        }, ctx=ctx)
+        if not res.get("success"):
+            return res
+        results = res["ffuf"].get("results", [])
+        found = [{"url": r.get("url"), "status": r.get("status")} for r in results]
+        out = {"success": True, "found": found, "ffuf": res["ffuf"]}
+        if res.get("truncated"):
+            out["truncated"] = True
+        return out
+    if not p.url:
+        return {"success": False, "error": "invalid params: url or hosts is required"}
 
+    cmd = ["gobuster", "dir", "-u", p.url, "-w", p.wordlist, "-t", str(p.threads), "-q"]
 
+    async def consume(stream):
+        # stdout is kept (capped) for the response; matches are reported line by line as read
+        raw = bytearray()
+        found: List[Dict[str, Any]] = []
+        pending = b""
+        while True:
+            chunk = await stream.read(65536)
+            data = pending + chunk
+            cut = len(data) if not chunk else data.rfind(b"\n") + 1
+            pending = data[cut:]
+            for entry in _parse_gobuster(data[:cut]):
+                found.append(entry)
+                await report_event(ctx, len(found), {"found": entry})
+            if not chunk:
+                return bytes(raw), found
+            if len(raw) + len(chunk) > CMD_STDOUT_CAP:
+                raw += chunk[:CMD_STDOUT_CAP - len(raw)]
+                raise OutputLimitExceeded((bytes(raw), found))
+            raw += chunk
+
+    if GOBUSTER_DOCKER.use:
+        rc, result, err, truncated = await run_in_docker_stream(
+            image=GOBUSTER_DOCKER.image,
+            cmd=cmd,
+            consume=consume,
+            mounts=None,
+            timeout=p.timeout_s,
+            network_mode=GOBUSTER_DOCKER.network,
+            cap_add=list(GOBUSTER_DOCKER.caps),
+        )
+    else:
+        rc, result, err, truncated = await run_cmd_stream(cmd, consume, timeout=p.timeout_s)
+    if rc == -1:
+        return {"success": False, "error": "timeout"}
+    out, found = result
+    if rc != 0 and not out:
+        return {"success": False, "stderr": err[:2000].decode(errors="ignore")}
+    res = {"success": True, "stdout": out.decode(errors="ignore"), "found": found}
+    if truncated:
+        res["truncated"] = True
+    return res
@@ -1,76 +1,452 @@
 import ipaddress
 import asyncio
+import errno
+import itertools
+import logging
+import os
+import random
+import re
+import socket
+import struct
+import sys
 import time
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, Optional, Tuple, Union
+
 from app.tools import run_cmd_capture
 
+try:
+    import liburing  # optional: io_uring TCP prober on Linux
+except ImportError:
+    liburing = None
+
+log = logging.getLogger("mcp.helpers")
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+_RTT_RE = re.compile(rb"time=([0-9.]+)\s*ms")
+
 
-def expand_to_ips(spec: str) -> List[str]:
-    parts = [p.strip() for p in spec.split(",") if p.strip()]
-    ips = []
-    for p in parts:
+def _ipv4_to_str(addr: int) -> str:
+    return socket.inet_ntoa(addr.to_bytes(4, "big"))
+
+
+def _spec_parts(spec: str) -> Iterator[Union[Tuple[int, int], ipaddress.IPv6Network, ipaddress.IPv6Address]]:
+    """
+    Parse a CIDR / range (a.b.c.d-e) / IP list into IPv4 [start, end) integer spans and
+    IPv6 networks/addresses; invalid entries are skipped.
+    """
+    for p in (p.strip() for p in spec.split(",")):
+        if not p:
+            continue
         if "/" in p:
-            net = ipaddress.ip_network(p, strict=False)
-            for ip in net.hosts():
-                ips.append(str(ip))
+            try:
+                net = ipaddress.ip_network(p, strict=False)
+            except ValueError:
+                continue
+            if net.version == 4:
+                base = int(net.network_address)
+                n = net.num_addresses
+                # hosts() semantics: drop network/broadcast except for /31 and /32
+                first, last = (1, n - 1) if n > 2 else (0, n)
+                yield base + first, base + last
+            else:
+                yield net
+        elif "-" in p and p.count(".") == 3:
+            left, right = p.split("-", 1)
+            try:
+                base, start = left.rsplit(".", 1)
+                prefix = int(ipaddress.IPv4Address(f"{base}.0"))
+                lo, hi = max(int(start), 0), min(int(right), 255)
+            except ValueError:
+                continue
+            if lo <= hi:
+                yield prefix + lo, prefix + hi + 1
         else:
-            if "-" in p and p.count(".") == 3:
-                left, right = p.split("-", 1)
-                try:
-                    base = left.rsplit(".", 1)[0]
-                    start = int(left.rsplit(".", 1)[1])
-                    end = int(right)
-                    for i in range(start, end + 1):
-                        ips.append(f"{base}.{i}")
-                except Exception:
-                    try:
-                        ipaddress.ip_address(p)
-                        ips.append(p)
-                    except Exception:
-                        continue
+            try:
+                ip = ipaddress.ip_address(p)
+            except ValueError:
+                continue
+            if ip.version == 4:
+                yield int(ip), int(ip) + 1
             else:
-                try:
-                    ipaddress.ip_address(p)
-                    ips.append(p)
-                except Exception:
-                    continue
-    seen = set()
-    out = []
-    for ip in ips:
-        if ip not in seen:
-            seen.add(ip)
-            out.append(ip)
-    return out
-
-
-async def _probe_tcp(ip: str, port: int, timeout_s: int) -> Tuple[bool, Optional[float]]:
-    start = time.perf_counter()
-    try:
-        fut = asyncio.open_connection(ip, port)
-        reader, writer = await asyncio.wait_for(fut, timeout=timeout_s)
-        rtt = (time.perf_counter() - start) * 1000.0
+                yield ip
+
+
+def iter_ips(spec: str) -> Iterator[str]:
+    """
+    Lazily yield unique host addresses of a CIDR / range (a.b.c.d-e) / IP list, in input order.
+    Only the seen-set grows with the number of hosts; no intermediate list is built.
+    """
+    seen_v4 = set()
+    seen_v6 = set()
+    for part in _spec_parts(spec):
+        if isinstance(part, tuple):
+            for addr in range(*part):
+                if addr not in seen_v4:
+                    seen_v4.add(addr)
+                    yield _ipv4_to_str(addr)
+        else:
+            for ip in (part.hosts() if isinstance(part, ipaddress.IPv6Network) else (part,)):
+                if ip not in seen_v6:
+                    seen_v6.add(ip)
+                    yield str(ip)
+
+
+_CONNECT_PENDING = {errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN}
+_LINGER_RST = struct.pack("ii", 1, 0)
+
+
+class TcpBatchProber:
+    """
+    Connect probes without the asyncio streams stack: a bare non-blocking socket per host,
+    connect_ex(), and the fd registered with the event loop's selector (epoll/kqueue) for
+    write readiness; SO_ERROR then tells a completed connect from a refused one.
+    """
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self._loop = loop or asyncio.get_running_loop()
+        # keyed by a per-probe id, not the fd: a closed fd number is reused by the next socket
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Tuple[socket.socket, int, asyncio.Future, float, asyncio.TimerHandle]] = {}
+
+    def close(self) -> None:
+        for probe_id in list(self._pending):
+            self._finish(probe_id, (False, None))
+
+    def __enter__(self) -> "TcpBatchProber":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _finish(self, probe_id: int, result: Tuple[bool, Optional[float]]) -> None:
+        entry = self._pending.pop(probe_id, None)
+        if entry is None:
+            return
+        sock, fd, fut, _, handle = entry
+        handle.cancel()
+        self._loop.remove_writer(fd)
+        sock.close()
+        if not fut.done():
+            fut.set_result(result)
+
+    def _on_writable(self, probe_id: int) -> None:
+        entry = self._pending.get(probe_id)
+        if entry is None:
+            return
+        sock, _, _, start, _ = entry
+        err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err == 0:
+            self._finish(probe_id, (True, round((time.perf_counter() - start) * 1000.0, 2)))
+        else:
+            self._finish(probe_id, (False, None))
+
+    async def probe(self, ip: str, port: int, timeout_s: float) -> Tuple[bool, Optional[float]]:
+        family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        # reset instead of FIN on close: no TIME_WAIT sockets piling up over a large sweep
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RST)
+        start = time.perf_counter()
+        try:
+            rc = sock.connect_ex((ip, port))
+        except OSError:
+            sock.close()
+            return False, None
+        if rc == 0:
+            sock.close()
+            return True, round((time.perf_counter() - start) * 1000.0, 2)
+        if rc not in _CONNECT_PENDING:
+            sock.close()
+            return False, None
+
+        probe_id = next(self._ids)
+        fd = sock.fileno()
+        fut = self._loop.create_future()
+        handle = self._loop.call_later(timeout_s, self._finish, probe_id, (False, None))
+        self._pending[probe_id] = (sock, fd, fut, start, handle)
+        self._loop.add_writer(fd, self._on_writable, probe_id)
         try:
-            writer.close()
-            await writer.wait_closed()
+            return await fut
+        finally:
+            self._finish(probe_id, (False, None))
+
+
+class UringTcpProber:
+    """
+    Connect probes through io_uring: each host is an IORING_OP_CONNECT linked to an
+    IORING_OP_LINK_TIMEOUT. Probes started in the same loop iteration are submitted with a
+    single io_uring_enter, and completions are reaped in batches when the ring's eventfd
+    (registered with the event loop) fires.
+    Raises OSError when io_uring or the python-liburing bindings are unavailable.
+    """
+
+    ENTRIES = 4096
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        if liburing is None or sys.platform != "linux":
+            raise OSError("io_uring not available")
+        self._loop = loop or asyncio.get_running_loop()
+        self._ring = liburing.Ring()
+        liburing.io_uring_queue_init(self.ENTRIES, self._ring)
+        try:
+            probe = liburing.io_uring_get_probe()
+            try:
+                if not liburing.io_uring_opcode_supported(probe, liburing.io_uring_op.IORING_OP_CONNECT):
+                    raise OSError("IORING_OP_CONNECT not supported by this kernel")
+            finally:
+                liburing.io_uring_free_probe(probe)
+            self._efd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+            liburing.io_uring_register_eventfd(self._ring, self._efd)
         except Exception:
+            liburing.io_uring_queue_exit(self._ring)
+            raise
+        self._cqe = liburing.Cqe()
+        self._ids = itertools.count(1)
+        # user_data -> (socket, future, start, sockaddr, timespec); sqe arguments stay referenced
+        # until the completion arrives, even if the awaiting probe was cancelled
+        self._pending: Dict[int, Tuple[socket.socket, asyncio.Future, float, object, object]] = {}
+        self._submit_scheduled = False
+        self._closed = False
+        self._loop.add_reader(self._efd, self._reap)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._loop.remove_reader(self._efd)
+        liburing.io_uring_queue_exit(self._ring)
+        os.close(self._efd)
+        for sock, fut, _, _, _ in self._pending.values():
+            sock.close()
+            if not fut.done():
+                fut.set_result((False, None))
+        self._pending.clear()
+
+    def __enter__(self) -> "UringTcpProber":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _submit(self) -> None:
+        self._submit_scheduled = False
+        if not self._closed:
+            liburing.io_uring_submit(self._ring)
+
+    def _reap(self) -> None:
+        try:
+            os.eventfd_read(self._efd)
+        except BlockingIOError:
             pass
-        return True, round(rtt, 2)
-    except Exception:
-        return False, None
+        while True:
+            try:
+                liburing.io_uring_peek_cqe(self._ring, self._cqe)
+            except OSError:
+                return  # CQ empty
+            entry = self._cqe[0]
+            user_data = entry.user_data
+            try:
+                res = entry.res
+            except OSError as e:
+                res = -e.errno
+            liburing.io_uring_cq_advance(self._ring, 1)
+            if user_data == 0:
+                continue  # link timeout completion
+            pending = self._pending.pop(user_data, None)
+            if pending is None:
+                continue
+            sock, fut, start, _, _ = pending
+            sock.close()
+            if not fut.done():
+                if res == 0:
+                    fut.set_result((True, round((time.perf_counter() - start) * 1000.0, 2)))
+                else:
+                    fut.set_result((False, None))
+
+    async def probe(self, ip: str, port: int, timeout_s: float) -> Tuple[bool, Optional[float]]:
+        v6 = ":" in ip
+        sock = socket.socket(socket.AF_INET6 if v6 else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RST)
+        try:
+            addr = liburing.Sockaddr(liburing.AF_INET6 if v6 else liburing.AF_INET, ip, port)
+        except Exception:
+            sock.close()
+            return False, None
+        ts = liburing.timespec(timeout_s)
+
+        # connect + link timeout must land in the same submission
+        if liburing.io_uring_sq_space_left(self._ring) < 2:
+            liburing.io_uring_submit(self._ring)
+        user_data = next(self._ids)
+        sqe = liburing.io_uring_get_sqe(self._ring)
+        liburing.io_uring_prep_connect(sqe, sock.fileno(), addr)
+        liburing.io_uring_sqe_set_data64(sqe, user_data)
+        liburing.io_uring_sqe_set_flags(sqe, liburing.IOSQE_IO_LINK)
+        sqe = liburing.io_uring_get_sqe(self._ring)
+        liburing.io_uring_prep_link_timeout(sqe, ts, 0)
+        liburing.io_uring_sqe_set_data64(sqe, 0)
+
+        fut = self._loop.create_future()
+        self._pending[user_data] = (sock, fut, time.perf_counter(), addr, ts)
+        if not self._submit_scheduled:
+            self._submit_scheduled = True
+            self._loop.call_soon(self._submit)
+        return await fut
+
+
+def make_tcp_prober() -> "TcpBatchProber | UringTcpProber":
+    """io_uring prober when the kernel and bindings support it, else the selector-based one."""
+    try:
+        return UringTcpProber()
+    except Exception as e:
+        log.debug("io_uring prober unavailable (%s), using selector prober", e)
+        return TcpBatchProber()
+
+
+async def _probe_tcp(
+    ip: str, port: int, timeout_s: int, prober: Optional[TcpBatchProber] = None
+) -> Tuple[bool, Optional[float]]:
+    if prober is not None:
+        return await prober.probe(ip, port, timeout_s)
+    with TcpBatchProber() as one_shot:
+        return await one_shot.probe(ip, port, timeout_s)
+
+
+# echo identifiers handed out per IcmpPinger: a raw socket sees every echo reply on the host,
+# so concurrent pingers must not share one
+_ICMP_IDENTS = itertools.count(random.getrandbits(16))
+
+
+def _icmp_checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+class IcmpPinger:
+    """
+    Send ICMP echo requests for a whole batch of IPv4 hosts from one socket.
+    Replies are matched to pending probes by (identifier, sequence) and source address.
+    Raises PermissionError when neither ping sockets nor raw sockets are allowed.
+    """
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self._loop = loop or asyncio.get_running_loop()
+        try:
+            # unprivileged ping socket (net.ipv4.ping_group_range); kernel owns the identifier
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            self._raw = False
+        except PermissionError:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            self._raw = True
+        self._sock.setblocking(False)
+        self._ident = next(_ICMP_IDENTS) & 0xFFFF
+        self._seq = itertools.count()
+        self._pending: Dict[Tuple[int, int], Tuple[asyncio.Future, float, str]] = {}
+        self._loop.add_reader(self._sock.fileno(), self._on_readable)
+
+    def close(self) -> None:
+        self._loop.remove_reader(self._sock.fileno())
+        self._sock.close()
+        for fut, _, _ in self._pending.values():
+            if not fut.done():
+                fut.set_result((False, None))
+        self._pending.clear()
+
+    def __enter__(self) -> "IcmpPinger":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _on_readable(self) -> None:
+        while True:
+            try:
+                data, addr = self._sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if self._raw:
+                data = data[(data[0] & 0x0F) * 4:]
+            if len(data) < 8 or data[0] != ICMP_ECHO_REPLY:
+                continue
+            ident, seq = struct.unpack("!HH", data[4:8])
+            if not self._raw:
+                ident = self._ident
+            entry = self._pending.get((ident, seq))
+            if entry is None or entry[2] != addr[0]:
+                continue
+            del self._pending[(ident, seq)]
+            fut, start, _ = entry
+            if not fut.done():
+                fut.set_result((True, round((time.perf_counter() - start) * 1000.0, 2)))
+
+    def _on_timeout(self, key: Tuple[int, int]) -> None:
+        entry = self._pending.pop(key, None)
+        if entry is not None and not entry[0].done():
+            entry[0].set_result((False, None))
+
+    async def ping(self, ip: str, timeout_s: float) -> Tuple[bool, Optional[float]]:
+        seq = next(self._seq) & 0xFFFF
+        key = (self._ident, seq)
+        header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, self._ident, seq)
+        payload = b"mcp-appsec".ljust(32, b"\x00")
+        packet = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, _icmp_checksum(header + payload), self._ident, seq) + payload
+
+        fut = self._loop.create_future()
+        deadline = time.perf_counter() + timeout_s
+        while True:
+            try:
+                self._pending[key] = (fut, time.perf_counter(), ip)
+                self._sock.sendto(packet, (ip, 0))
+                break
+            except (BlockingIOError, InterruptedError):
+                # send buffer full on large batches: yield and retry until the probe deadline
+                self._pending.pop(key, None)
+                if time.perf_counter() >= deadline:
+                    return False, None
+                await asyncio.sleep(0.001)
+            except OSError:
+                self._pending.pop(key, None)
+                return False, None
+        handle = self._loop.call_later(max(0.0, deadline - time.perf_counter()), self._on_timeout, key)
+        try:
+            return await fut
+        finally:
+            handle.cancel()
+            self._pending.pop(key, None)
+
+
+async def _probe_icmp(ip: str, timeout_s: int, pinger: Optional[IcmpPinger] = None) -> Tuple[bool, Optional[float]]:
+    # IcmpPinger is AF_INET only; IPv6 targets go through the system ping (ICMPv6)
+    if ":" in ip:
+        return await _probe_icmp_cmd(ip, timeout_s)
+    if pinger is not None:
+        return await pinger.ping(ip, timeout_s)
+    try:
+        pinger = IcmpPinger()
+    except PermissionError:
+        return await _probe_icmp_cmd(ip, timeout_s)
+    with pinger:
+        return await pinger.ping(ip, timeout_s)
 
 
-async def _probe_icmp(ip: str, timeout_s: int) -> Tuple[bool, Optional[float]]:
+async def _probe_icmp_cmd(ip: str, timeout_s: int) -> Tuple[bool, Optional[float]]:
     cmd = ["ping", "-c", "1", "-W", str(int(timeout_s)), ip]
-    rc, out, err = await run_cmd_capture(cmd, timeout=timeout_s + 2)
+    rc, out, err, _ = await run_cmd_capture(cmd, timeout=timeout_s + 2)
     if rc != 0:
-        txt = out or err or ""
-        import re
-        m = re.search(r"time=([0-9.]+)\s*ms", txt)
+        txt = out or err
+        m = _RTT_RE.search(txt)
         if m:
             return True, float(m.group(1))
         return False, None
-    import re
-    m = re.search(r"time=([0-9.]+)\s*ms", out)
+    m = _RTT_RE.search(out)
     if m:
         return True, float(m.group(1))
     return True, None
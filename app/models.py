@@ -1,8 +1,10 @@
-from pydantic import BaseModel, Field, ConfigDict
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter
 
 
 class NmapParams(BaseModel):
-    model_config = ConfigDict(extra='ignore')
+    model_config = ConfigDict(frozen=True, extra="ignore", validate_default=False, arbitrary_types_allowed=False)
     target: str = Field(description="IPv4/IPv6 hoặc hostname trong scope")
     ports: str = Field("1-1024", description='VD: "22,80" hoặc "1-65535"')
     timeout_s: int = Field(60, ge=5, le=600, description="Giây")
@@ -11,7 +13,7 @@ class NmapParams(BaseModel):
 
 
 class PingSweepParams(BaseModel):
-    model_config = ConfigDict(extra="ignore")
+    model_config = ConfigDict(frozen=True, extra="ignore", validate_default=False, arbitrary_types_allowed=False)
     network: str = Field(..., description="CIDR (e.g. '10.0.0.0/24') or single IP or comma-separated list")
     method: str = Field("icmp", description="'icmp' or 'tcp' (tcp uses a connect to port)")
     tcp_port: int = Field(80, description="Port to try when method='tcp'")
@@ -21,30 +23,41 @@ class PingSweepParams(BaseModel):
 
 
 class HostProbeParams(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore", validate_default=False, arbitrary_types_allowed=False)
     host: str
     timeout_s: int = Field(5, ge=1, le=60)
 
 
 class FfufParams(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    url: str = Field(..., description="URL with FUZZ marker, e.g. http://target/FUZZ")
+    model_config = ConfigDict(frozen=True, extra="ignore", validate_default=False, arbitrary_types_allowed=False)
+    url: Optional[str] = Field(None, description="URL with FUZZ marker, e.g. http://target/FUZZ")
     wordlist: str = Field("/usr/share/seclists/Discovery/Web-Content/common.txt")
     threads: int = Field(40, ge=1, le=200)
     timeout_s: int = Field(120, ge=5, le=3600)
     store_raw: bool = Field(False)
+    hosts: Optional[List[str]] = Field(None, description="Batch mode: base URLs fed to ffuf as the HOST wordlist")
+    url_template: Optional[str] = Field(None, description="Batch mode: URL with HOST and FUZZ markers, e.g. HOST/FUZZ")
 
 
 class WhatwebParams(BaseModel):
-    model_config = ConfigDict(extra="ignore")
+    model_config = ConfigDict(frozen=True, extra="ignore", validate_default=False, arbitrary_types_allowed=False)
     target: str = Field(..., description="host or URL")
     timeout_s: int = Field(30, ge=1, le=600)
 
 
 class GobusterParams(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    url: str = Field(..., description="base url or dir, e.g. http://target")
+    model_config = ConfigDict(frozen=True, extra="ignore", validate_default=False, arbitrary_types_allowed=False)
+    url: Optional[str] = Field(None, description="base url or dir, e.g. http://target")
     wordlist: str = Field("/opt/SecLists/Discovery/Web-Content/common.txt")
     threads: int = Field(40, ge=1, le=200)
     timeout_s: int = Field(120, ge=5, le=3600)
+    hosts: Optional[List[str]] = Field(None, description="Batch mode: base URLs, scanned in one ffuf process")
 
 
+# Validators built once at import; tools call .validate_python(params) on the cached core schema.
+NMAP_VALIDATOR = TypeAdapter(NmapParams)
+PING_SWEEP_VALIDATOR = TypeAdapter(PingSweepParams)
+HOST_PROBE_VALIDATOR = TypeAdapter(HostProbeParams)
+FFUF_VALIDATOR = TypeAdapter(FfufParams)
+WHATWEB_VALIDATOR = TypeAdapter(WhatwebParams)
+GOBUSTER_VALIDATOR = TypeAdapter(GobusterParams)
@@ -1,29 +1,98 @@
-import os
 import re
 import asyncio
-from typing import Dict, Any, List
+import itertools
+from typing import Dict, Any, List, AsyncIterator, Iterable, Optional, Tuple
+
+from fastmcp import Context
 
 from app.tools import (
     build_nmap_cmd,
     run_cmd_capture,
-    parse_nmap_json,
-    make_job_tmpdir,
-    cleanup_tmpdir,
-    run_in_docker,
+    run_cmd_stream,
+    collect_nmap_hosts,
+    run_in_docker_stream,
+    report_event,
+    response_cache,
+    iter_line_chunks,
+    load_docker_profile,
 )
 from app.models import (
-    NmapParams,
-    HostProbeParams,
+    NMAP_VALIDATOR,
+    HOST_PROBE_VALIDATOR,
+    PING_SWEEP_VALIDATOR,
     PingSweepParams,
 )
 from app.helpers import (
-    expand_to_ips,
+    iter_ips,
+    IcmpPinger,
+    make_tcp_prober,
     _probe_icmp,
+    _probe_icmp_cmd,
     _probe_tcp
 )
 
+NMAP_DOCKER = load_docker_profile("NMAP", "my-nmap:latest", network="host", caps="NET_RAW,NET_ADMIN")
+
+_PORT_RE = re.compile(rb"\b([1-9][0-9]{0,4})\b")
+
+
+def _parse_ports(out: bytes) -> List[int]:
+    ports = set()
+    for chunk in iter_line_chunks(out):
+        ports.update(int(n) for n in _PORT_RE.findall(chunk))
+    return sorted(p for p in ports if p <= 65535)
+
+
+async def _ping_sweep_events(p: PingSweepParams, ips: Iterable[str]) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Probe ips as they are produced, with a rolling window of at most p.concurrency tasks in
+    flight; yield (input index, host result) as each probe finishes.
+    """
+    pinger = None
+    prober = None
+    if p.method.lower() == "icmp":
+        try:
+            pinger = IcmpPinger()
+        except PermissionError:
+            pinger = None
+    else:
+        prober = make_tcp_prober()
+
+    async def probe(i: int, ip: str) -> Tuple[int, Dict[str, Any]]:
+        try:
+            if pinger is not None:
+                alive, rtt = await _probe_icmp(ip, p.timeout_s, pinger)
+            elif p.method.lower() == "icmp":
+                alive, rtt = await _probe_icmp_cmd(ip, p.timeout_s)
+            else:
+                alive, rtt = await _probe_tcp(ip, p.tcp_port, p.timeout_s, prober)
+            return i, {"ip": ip, "alive": bool(alive), "rtt_ms": rtt}
+        except Exception as e:
+            return i, {"ip": ip, "alive": False, "rtt_ms": None, "error": str(e)}
+
+    source = enumerate(ips)
+    in_flight: set = set()
+    try:
+        while True:
+            for i, ip in source:
+                in_flight.add(asyncio.create_task(probe(i, ip)))
+                if len(in_flight) >= p.concurrency:
+                    break
+            if not in_flight:
+                break
+            finished, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for t in finished:
+                yield t.result()
+    finally:
+        for t in in_flight:
+            t.cancel()
+        if pinger is not None:
+            pinger.close()
+        if prober is not None:
+            prober.close()
+
 
-async def ping_sweep(params: Dict[str, Any]) -> Dict[str, Any]:
+async def ping_sweep(params: Dict[str, Any], ctx: Optional[Context] = None) -> Dict[str, Any]:
     """
     Ping-sweep a range of IPs.
     Thăm dò host trong một CIDR/list.
@@ -38,7 +107,9 @@ async def ping_sweep(params: Dict[str, Any]) -> Dict[str, Any]:
 
     PARAMETERS (PingSweepParams):
       - network (str, required): CIDR (e.g. "10.0.0.0/24"), single IP, or comma-separated list.
-      - method (str): "icmp" or "tcp". "icmp" uses system ping (may require CAP_NET_RAW).
+      - method (str): "icmp" or "tcp". "icmp" sends echo requests from one ICMP socket
+        (ping socket or raw socket with CAP_NET_RAW); falls back to system ping if neither is allowed.
+        IPv6 targets always use the system ping.
       - tcp_port (int): port to attempt when method="tcp" (default 80).
       - concurrency (int): parallel workers (default 50).
       - timeout_s (int): timeout per host in seconds (default 2).
@@ -48,64 +119,58 @@ async def ping_sweep(params: Dict[str, Any]) -> Dict[str, Any]:
       - success: bool
       - scanned: int
       - alive_count: int
-      - hosts: [{ "ip": "...", "alive": true|false, "rtt_ms": 12.34|null }]
+      - hosts: [{ "ip": "...", "alive": true|false, "rtt_ms": 12.34|null }] (in input order, duplicates removed)
       - errors: optional list of strings
 
+    STREAMING:
+      - Each host result is also pushed as soon as it is known, as a JSON line in an MCP
+        progress notification (when the client sends a progress token).
+
     EXAMPLE:
       await ping_sweep({"network":"10.0.0.0/28", "method":"tcp", "tcp_port":22})
     """
     try:
-        p = PingSweepParams(**params)
+        p = PING_SWEEP_VALIDATOR.validate_python(params)
     except Exception as e:
         return {"success": False, "error": f"invalid params: {e}"}
 
-    ips = expand_to_ips(p.network)
-    if not ips:
+    # exact deduplicated count (overlapping parts counted once), bounded by the cap:
+    # a /8 or an IPv6 prefix is never enumerated in full
+    total = sum(1 for _ in itertools.islice(iter_ips(p.network), p.max_hosts + 1))
+    if total > p.max_hosts:
+        return {"success": False, "error": "too_many_hosts", "max_hosts": p.max_hosts, "count_at_least": total}
+    if not total:
         return {"success": False, "error": "no valid hosts parsed from network"}
 
-    if len(ips) > p.max_hosts:
-        return {"success": False, "error": "too_many_hosts", "count": len(ips)}
-
-    q = asyncio.Queue()
-    for ip in ips:
-        q.put_nowait(ip)
-
-    results: List[Dict[str, Any]] = []
+    # addresses are generated lazily and probed as produced; events arrive in completion order
+    # and are slotted back into input order
+    results: List[Optional[Dict[str, Any]]] = [None] * total
     errors: List[str] = []
+    alive_count = 0
+    seq = 0
+    async for i, event in _ping_sweep_events(p, iter_ips(p.network)):
+        seq += 1
+        await report_event(ctx, seq, event, total=total)
+        err = event.pop("error", None)
+        if err is not None:
+            errors.append(f"{event['ip']}: {err}")
+        alive_count += event["alive"]
+        results[i] = event
+    results = [r for r in results if r is not None]
 
-    async def worker():
-        while True:
-            try:
-                ip = q.get_nowait()
-            except asyncio.QueueEmpty:
-                break
-            try:
-                if p.method.lower() == "icmp":
-                    alive, rtt = await _probe_icmp(ip, p.timeout_s)
-                else:
-                    alive, rtt = await _probe_tcp(ip, p.tcp_port, p.timeout_s)
-                results.append({"ip": ip, "alive": bool(alive), "rtt_ms": rtt})
-            except Exception as e:
-                errors.append(f"{ip}: {e}")
-                results.append({"ip": ip, "alive": False, "rtt_ms": None})
-
-    concurrency = min(p.concurrency, max(1, len(ips)))
-    tasks = [asyncio.create_task(worker()) for _ in range(concurrency)]
-    await asyncio.gather(*tasks)
-
-    alive_count = sum(1 for r in results if r.get("alive"))
     return {
         "success": True,
-        "scanned": len(ips),
+        "scanned": len(results),
         "alive_count": alive_count,
-        "hosts": sorted(results, key=lambda x: x["ip"]),
+        "hosts": results,
         "errors": errors[:20]
     }
 
 
+@response_cache("nmap")
 async def nmap_services_detection(params: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Thực hiện quét nhanh bằng Nmap và trả về kết quả ở dạng JSON.
+    Thực hiện quét nhanh bằng Nmap và trả về kết quả ở dạng JSON (chuyển từ XML `-oX -`, parse dạng stream).
     Nếu có danh sách ports rồi thì dùng nmap_services_detection để phát hiện service.
 
     MỤC ĐÍCH:
@@ -120,7 +185,8 @@ async def nmap_services_detection(params: Dict[str, Any]) -> Dict[str, Any]:
       - service_detection (bool, mặc định True): bật -sV để phát hiện service/version.
 
     ĐẦU RA (JSON):
-      - {"success": true, "nmap": {...}} nếu scan thành công (payload từ `nmap -oJ`).
+      - {"success": true, "nmap": {"hosts": [...], "summary": {...}}} nếu scan thành công.
+        Mỗi host: status, addresses, hostnames, ports [{protocol, port, state, service}].
       - {"success": false, "error": "..."} nếu lỗi validate, out-of-scope, timeout, hoặc tool fail.
       - {"success": false, "stderr": "..."} nếu Nmap trả lỗi.
 
@@ -135,41 +201,33 @@ async def nmap_services_detection(params: Dict[str, Any]) -> Dict[str, Any]:
 
     GHI CHÚ:
       - Hàm sẽ kiểm tra scope trước khi chạy (theo ALLOWED_PREFIX).
-      - Kết quả trả về là JSON parse được từ `nmap -oJ`, giúp dễ xử lý tự động.
+      - Nmap không có output JSON gốc: XML từ `nmap -oX -` được parse tăng dần (từng <host>),
+        không giữ toàn bộ stdout trong bộ nhớ.
     """
     try:
-        p = NmapParams(**params)
+        p = NMAP_VALIDATOR.validate_python(params)
     except Exception as e:
         return {"success": False, "error": f"invalid params: {e}"}
 
-    job_tmp = make_job_tmpdir()
-    try:
-        cmd = build_nmap_cmd(p.target, ports=p.ports, fast=p.fast, service_detection=p.service_detection)
-        use_docker = os.getenv("NMAP_USE_DOCKER", "false").lower() in {"1", "true", "yes"}
-        if use_docker:
-            image = os.getenv("NMAP_DOCKER_IMAGE", "my-nmap:latest")
-            network_mode = os.getenv("NMAP_DOCKER_NETWORK", "host")
-            caps_env = os.getenv("NMAP_DOCKER_CAPS", "NET_RAW,NET_ADMIN")
-            cap_add = [c.strip() for c in caps_env.split(",") if c.strip()]
-            rc, out, err = await run_in_docker(
-                image=image,
-                cmd=cmd,
-                mounts=None,
-                timeout=p.timeout_s,
-                network_mode=network_mode,
-                cap_add=cap_add,
-            )
-        else:
-            rc, out, err = await run_cmd_capture(cmd, timeout=p.timeout_s)
-        if rc == -1:
-            return {"success": False, "error": "timeout"}
-        if rc != 0:
-            return {"success": False, "stderr": err[:2000]}
-
-        payload = parse_nmap_json(out)
-        return {"success": True, "nmap": payload}
-    finally:
-        cleanup_tmpdir(job_tmp)
+    cmd = build_nmap_cmd(p.target, ports=p.ports, fast=p.fast, service_detection=p.service_detection)
+    if NMAP_DOCKER.use:
+        rc, payload, err, _ = await run_in_docker_stream(
+            image=NMAP_DOCKER.image,
+            cmd=cmd,
+            consume=collect_nmap_hosts,
+            mounts=None,
+            timeout=p.timeout_s,
+            network_mode=NMAP_DOCKER.network,
+            cap_add=list(NMAP_DOCKER.caps),
+        )
+    else:
+        rc, payload, err, _ = await run_cmd_stream(cmd, collect_nmap_hosts, timeout=p.timeout_s)
+    if rc == -1:
+        return {"success": False, "error": "timeout"}
+    if rc != 0:
+        return {"success": False, "stderr": err[:2000].decode(errors="ignore")}
+
+    return {"success": True, "nmap": payload}
 
 
 async def host_probe(params: Dict[str, Any]) -> Dict[str, Any]:
@@ -178,15 +236,21 @@ async def host_probe(params: Dict[str, Any]) -> Dict[str, Any]:
     params: {"host":"127.0.0.1", "timeout_s":3}
     """
     try:
-        p = HostProbeParams(**params)
+        p = HOST_PROBE_VALIDATOR.validate_python(params)
     except Exception as e:
         return {"success": False, "error": f"invalid params: {e}"}
 
     cmd = ["ping", "-c", "1", "-W", str(max(1, p.timeout_s)), p.host]
-    rc, out, err = await run_cmd_capture(cmd, timeout=p.timeout_s + 1)
-    return {"success": rc == 0, "rc": rc, "stdout": out[:1000], "stderr": err[:1000]}
+    rc, out, err, _ = await run_cmd_capture(cmd, timeout=p.timeout_s + 1)
+    return {
+        "success": rc == 0,
+        "rc": rc,
+        "stdout": out[:1000].decode(errors="ignore"),
+        "stderr": err[:1000].decode(errors="ignore"),
+    }
 
 
+@response_cache("rustscan")
 async def rustscan_range_ports(
     target: str,
     range: str = "1-65535",
@@ -211,6 +275,7 @@ async def rustscan_range_ports(
       - range (list[int])  — danh sách cổng mở (nếu success)
       - stdout: raw output từ RustScan (dạng greppable, liệt kê port mở).
       - stderr (tùy chọn): nếu có lỗi.
+      - truncated (tùy chọn): true nếu stdout vượt CMD_STDOUT_CAP và RustScan bị dừng (kết quả không đầy đủ).
 
     VÍ DỤ GỌI:
       rustscan_range_ports(target="10.10.10.10", range="1-65535", timeout_s=60)
@@ -229,9 +294,15 @@ async def rustscan_range_ports(
         "--ulimit", "10000",
         "-g"
     ]
-    rc, out, err = await run_cmd_capture(cmd, timeout=timeout_s + 5)
-    if rc != 0:
-        return {"success": False, "stderr": err[:2000], "stdout": out[:1000]}
-    nums = re.findall(r"\b([1-9][0-9]{0,4})\b", out)
-    ports_found = sorted({int(n) for n in nums if 1 <= int(n) <= 65535})
-    return {"success": True, "ports": ports_found, "stdout": out}
+    rc, out, err, truncated = await run_cmd_capture(cmd, timeout=timeout_s + 5)
+    if rc != 0 and not truncated:
+        return {
+            "success": False,
+            "stderr": err[:2000].decode(errors="ignore"),
+            "stdout": out[:1000].decode(errors="ignore"),
+        }
+    ports_found = await asyncio.to_thread(_parse_ports, out)
+    res = {"success": True, "ports": ports_found, "stdout": out.decode(errors="ignore")}
+    if truncated:
+        res["truncated"] = True
+    return res
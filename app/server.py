@@ -3,6 +3,7 @@ import logging
 
 from app.recon import register as register_recon
 from app.enum import register as register_enum
+from app.tools import serialize_tool_result
 
 log = logging.getLogger("mcp.server")
 log.setLevel(logging.INFO)
@@ -15,7 +16,7 @@ except Exception as e:
 
 from fastmcp import FastMCP
 
-mcp = FastMCP("mcp-appsec")
+mcp = FastMCP("mcp-appsec", tool_serializer=serialize_tool_result)
 
 # Register grouped tools
 register_recon(mcp)
@@ -1,11 +1,25 @@
 import asyncio
+import atexit
+import functools
+import hashlib
+import inspect
 import os
-import json
 import shutil
+import signal
+import subprocess
 import tempfile
+import time
 import uuid
 import logging
-from typing import Tuple, List, Dict, Any, Optional
+import xml.etree.ElementTree as ET
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Tuple, List, Dict, Any, Optional, Callable, Awaitable, AsyncIterator, Iterator, IO, Mapping, Union
+
+import ijson
+import orjson
+from cachetools import TTLCache
+from fastmcp import Context
 
 log = logging.getLogger("mcp.tools")
 log.setLevel(logging.INFO)
@@ -13,6 +27,84 @@ log.setLevel(logging.INFO)
 ALLOWED_PREFIX = os.getenv("ALLOWED_PREFIX", "")  # legacy prefix scope
 DEFAULT_MIN_RATE = os.getenv("DEFAULT_MIN_RATE", "1000")
 DOCKER_CMD = os.getenv("DOCKER_CMD", "docker")
+DOCKER_POOL_IDLE_TTL = int(os.getenv("DOCKER_POOL_IDLE_TTL", "300"))  # 0 disables the pool
+CMD_STDOUT_CAP = int(os.getenv("CMD_STDOUT_CAP", str(64 * 1024 * 1024)))
+CMD_STDERR_CAP = int(os.getenv("CMD_STDERR_CAP", str(1024 * 1024)))
+KILL_GRACE_S = 2  # wait for a killed process group to release its pipes
+PARSE_CHUNK_SIZE = 1024 * 1024
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+RAW_OUTPUT_DIR = os.getenv("RAW_OUTPUT_DIR", os.path.join(tempfile.gettempdir(), "mcp-raw"))
+RAW_OUTPUT_RETENTION = int(os.getenv("RAW_OUTPUT_RETENTION", "86400"))  # seconds
+
+
+# successful tool responses keyed by (tool, canonical call args); see response_cache
+_RESPONSE_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=RESPONSE_CACHE_TTL)
+_RESPONSE_INFLIGHT: Dict[str, "asyncio.Future[Any]"] = {}
+_LEADER_CANCELLED = object()
+
+
+def _response_cache_key(kind: str, arguments: Dict[str, Any]) -> Optional[str]:
+    if any(isinstance(v, dict) and v.get("store_raw") for v in arguments.values()):
+        return None
+    try:
+        blob = orjson.dumps(arguments, option=orjson.OPT_SORT_KEYS)
+    except TypeError:
+        return None
+    return f"{kind}:{hashlib.blake2b(blob, digest_size=16).hexdigest()}"
+
+
+def response_cache(kind: str) -> Callable[[Callable[..., Awaitable[Dict[str, Any]]]], Callable[..., Awaitable[Dict[str, Any]]]]:
+    """
+    Cache successful responses of an idempotent tool for RESPONSE_CACHE_TTL seconds.
+    Concurrent calls with the same arguments are single-flight: one runs the scan, the
+    others await its result. Failures are not cached; store_raw calls and MCP_NOCACHE=1 bypass it.
+    """
+    def decorator(fn: Callable[..., Awaitable[Dict[str, Any]]]) -> Callable[..., Awaitable[Dict[str, Any]]]:
+        sig = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> Dict[str, Any]:
+            if RESPONSE_CACHE_TTL <= 0 or os.getenv("MCP_NOCACHE") == "1":
+                return await fn(*args, **kwargs)
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = _response_cache_key(kind, bound.arguments)
+            if key is None:
+                return await fn(*args, **kwargs)
+            while True:
+                hit = _RESPONSE_CACHE.get(key)
+                if hit is not None:
+                    return dict(hit)
+                inflight = _RESPONSE_INFLIGHT.get(key)
+                if inflight is None:
+                    break
+                res = await asyncio.shield(inflight)
+                if res is not _LEADER_CANCELLED:
+                    return dict(res)
+                # the caller running the scan was cancelled: look again, or take over the scan
+
+            fut = asyncio.get_running_loop().create_future()
+            _RESPONSE_INFLIGHT[key] = fut
+            try:
+                res = await fn(*args, **kwargs)
+            except asyncio.CancelledError:
+                fut.set_result(_LEADER_CANCELLED)
+                raise
+            except BaseException as e:
+                fut.set_exception(e)
+                fut.exception()  # mark retrieved when nobody else is waiting
+                raise
+            else:
+                if isinstance(res, dict) and res.get("success"):
+                    _RESPONSE_CACHE[key] = res
+                fut.set_result(res)
+                return dict(res)
+            finally:
+                _RESPONSE_INFLIGHT.pop(key, None)
+
+        return wrapper
+
+    return decorator
 
 
 def in_allowed_scope(target: str) -> bool:
@@ -21,6 +113,39 @@ def in_allowed_scope(target: str) -> bool:
     return target.startswith(ALLOWED_PREFIX)
 
 
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode(errors="ignore")
+    return str(obj)
+
+
+def serialize_tool_result(data: Any) -> str:
+    """FastMCP tool_serializer: tool responses are encoded with orjson instead of the default encoder."""
+    return orjson.dumps(data, default=_json_default).decode()
+
+
+async def report_event(
+    ctx: Optional[Context],
+    seq: int,
+    event: Dict[str, Any],
+    total: Optional[int] = None,
+) -> None:
+    """
+    Push one result to the MCP client as it is produced: the event is sent as a compact
+    JSON line in a progress notification. No-op without a context or progress token.
+    """
+    if ctx is None:
+        return
+    try:
+        await ctx.report_progress(seq, total, orjson.dumps(event, default=_json_default).decode())
+    except Exception:
+        log.debug("report_event failed", exc_info=True)
+
+
 def make_job_tmpdir(job_id: Optional[str] = None) -> str:
     jid = job_id or uuid.uuid4().hex
     path = os.path.join(tempfile.gettempdir(), f"mcp-job-{jid}")
@@ -35,36 +160,225 @@ def cleanup_tmpdir(path: str) -> None:
         log.exception("cleanup_tmpdir failed for %s", path)
 
 
-async def run_cmd_capture(cmd: List[str], timeout: int) -> Tuple[int, str, str]:
-    log.debug("run_cmd_capture: %s timeout=%s", cmd, timeout)
-    proc = await asyncio.create_subprocess_exec(
+def make_raw_output_path(tool: str, ext: str) -> str:
+    """
+    Path for a store_raw output file under RAW_OUTPUT_DIR. Files older than
+    RAW_OUTPUT_RETENTION seconds are pruned each time a new one is allocated.
+    """
+    os.makedirs(RAW_OUTPUT_DIR, exist_ok=True)
+    cutoff = time.time() - RAW_OUTPUT_RETENTION
+    try:
+        with os.scandir(RAW_OUTPUT_DIR) as it:
+            for entry in it:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+                except OSError:
+                    pass
+    except OSError:
+        log.warning("cannot prune raw output dir %s", RAW_OUTPUT_DIR)
+    return os.path.join(RAW_OUTPUT_DIR, f"{tool}-{uuid.uuid4().hex}.{ext}")
+
+
+@asynccontextmanager
+async def maybe_tmpdir(needed: bool) -> AsyncIterator[Optional[str]]:
+    """Job tmpdir that is only created (and removed) when the job actually writes files."""
+    if not needed:
+        yield None
+        return
+    path = make_job_tmpdir()
+    try:
+        yield path
+    finally:
+        cleanup_tmpdir(path)
+
+
+async def _bounded_read(
+    stream: asyncio.StreamReader,
+    cap: int,
+    stop_on_overflow: bool = False,
+) -> Tuple[bytes, bool]:
+    """
+    Read stream keeping at most `cap` bytes. Past the cap the rest is drained and discarded,
+    or, with stop_on_overflow, reading stops so the caller can kill the producer.
+    Returns (data, truncated).
+    """
+    buf = bytearray()
+    truncated = False
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            return bytes(buf), truncated
+        if truncated:
+            continue
+        room = cap - len(buf)
+        if len(chunk) > room:
+            buf += chunk[:room]
+            truncated = True
+            if stop_on_overflow:
+                return bytes(buf), truncated
+            continue
+        buf += chunk
+
+
+async def _drain(stream: asyncio.StreamReader) -> None:
+    while await stream.read(65536):
+        pass
+
+
+async def _spawn(cmd: List[str]) -> asyncio.subprocess.Process:
+    # own session / process group, so a kill also reaches children that inherited the pipes
+    return await asyncio.create_subprocess_exec(
         *cmd,
         stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
     )
+
+
+async def _kill_and_reap(proc: asyncio.subprocess.Process) -> None:
+    """
+    SIGKILL proc's process group and wait for it, at most KILL_GRACE_S seconds.
+    wait() only returns once both pipes hit EOF, so stdout is drained meanwhile (the caller
+    keeps reading stderr); a straggler outside the group that still holds a pipe makes us
+    close the pipes instead of waiting on it.
+    """
     try:
-        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
-        out = stdout.decode(errors="ignore") if stdout else ""
-        err = stderr.decode(errors="ignore") if stderr else ""
-        return proc.returncode, out, err
-    except asyncio.TimeoutError:
-        log.warning("timeout running cmd %s", cmd)
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
         try:
             proc.kill()
-        except Exception:
+        except ProcessLookupError:
             pass
-        await proc.communicate()
-        return -1, "", "timeout"
+    drain = asyncio.create_task(_drain(proc.stdout))
+    try:
+        await asyncio.wait_for(proc.wait(), timeout=KILL_GRACE_S)
+    except asyncio.TimeoutError:
+        log.warning("pid %s: pipes still open %ss after kill, closing them", proc.pid, KILL_GRACE_S)
+        proc._transport.close()
+    finally:
+        drain.cancel()
 
 
-async def run_in_docker(
+async def _stderr_result(err_task: "asyncio.Task[Tuple[bytes, bool]]") -> bytes:
+    """stderr collected so far; after a kill the reader gets KILL_GRACE_S to reach EOF."""
+    try:
+        return (await asyncio.wait_for(asyncio.shield(err_task), timeout=KILL_GRACE_S))[0]
+    except asyncio.TimeoutError:
+        err_task.cancel()
+        return b""
+
+
+async def run_cmd_capture(cmd: List[str], timeout: int) -> Tuple[int, bytes, bytes, bool]:
+    """
+    Run cmd and return (returncode, stdout, stderr, truncated) with raw bytes; returncode is
+    -1 on timeout. stdout is capped at CMD_STDOUT_CAP (the process group is killed past it)
+    and stderr at CMD_STDERR_CAP; truncated is True when stdout was cut.
+    Callers decode only the part they return.
+    """
+    log.debug("run_cmd_capture: %s timeout=%s", cmd, timeout)
+    proc = await _spawn(cmd)
+    err_task = asyncio.create_task(_bounded_read(proc.stderr, CMD_STDERR_CAP))
+
+    async def _read_and_wait():
+        out, truncated = await _bounded_read(proc.stdout, CMD_STDOUT_CAP, stop_on_overflow=True)
+        if not truncated:
+            await proc.wait()
+        return out, truncated
+
+    try:
+        out, truncated = await asyncio.wait_for(_read_and_wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        log.warning("timeout running cmd %s", cmd)
+        await _kill_and_reap(proc)
+        err_task.cancel()
+        return -1, b"", b"timeout", False
+    except BaseException:
+        await _kill_and_reap(proc)
+        err_task.cancel()
+        raise
+    if truncated:
+        log.warning("output exceeded %s bytes, killing pid %s", CMD_STDOUT_CAP, proc.pid)
+        await _kill_and_reap(proc)
+    return proc.returncode, out, await _stderr_result(err_task), truncated
+
+
+class OutputLimitExceeded(Exception):
+    """Raised by a run_cmd_stream consumer that has collected enough; carries its partial result."""
+
+    def __init__(self, result: Any):
+        super().__init__("output limit exceeded")
+        self.result = result
+
+
+async def run_cmd_stream(
+    cmd: List[str],
+    consume: Callable[[asyncio.StreamReader], Awaitable[Any]],
+    timeout: int,
+) -> Tuple[int, Any, bytes, bool]:
+    """
+    Run cmd and hand its stdout to `consume` as it is produced instead of buffering it.
+    Returns (returncode, consume result, stderr bytes, truncated); returncode is -1 on timeout.
+    A consumer raising OutputLimitExceeded gets the process group killed, and its partial
+    result is returned with truncated=True.
+    """
+    log.debug("run_cmd_stream: %s timeout=%s", cmd, timeout)
+    proc = await _spawn(cmd)
+    err_task = asyncio.create_task(_bounded_read(proc.stderr, CMD_STDERR_CAP))
+
+    async def _consume_and_wait():
+        result = await consume(proc.stdout)
+        # drain whatever the consumer left so the child never blocks on a full pipe
+        await _drain(proc.stdout)
+        await proc.wait()
+        return result
+
+    try:
+        result = await asyncio.wait_for(_consume_and_wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        log.warning("timeout running cmd %s", cmd)
+        await _kill_and_reap(proc)
+        err_task.cancel()
+        return -1, None, b"timeout", False
+    except OutputLimitExceeded as e:
+        log.warning("output limit reached, killing pid %s", proc.pid)
+        await _kill_and_reap(proc)
+        return proc.returncode, e.result, await _stderr_result(err_task), True
+    except BaseException:
+        await _kill_and_reap(proc)
+        err_task.cancel()
+        raise
+    return proc.returncode, result, await _stderr_result(err_task), False
+
+
+@dataclass(frozen=True)
+class DockerProfile:
+    """Per-tool Docker settings, read once from <TOOL>_USE_DOCKER / _DOCKER_IMAGE / _DOCKER_NETWORK / _DOCKER_CAPS."""
+    use: bool
+    image: str
+    network: Optional[str]
+    caps: Tuple[str, ...]
+
+
+def load_docker_profile(
+    tool: str, image: str, network: Optional[str] = None, caps: str = ""
+) -> DockerProfile:
+    caps_env = os.getenv(f"{tool}_DOCKER_CAPS", caps)
+    return DockerProfile(
+        use=os.getenv(f"{tool}_USE_DOCKER", "false").lower() in {"1", "true", "yes"},
+        image=os.getenv(f"{tool}_DOCKER_IMAGE", image),
+        network=os.getenv(f"{tool}_DOCKER_NETWORK", network) or None,
+        caps=tuple(c.strip() for c in caps_env.split(",") if c.strip()),
+    )
+
+
+def build_docker_cmd(
     image: str,
     cmd: List[str],
     mounts: Optional[List[Tuple[str, str]]] = None,
-    timeout: int = 60,
     network_mode: Optional[str] = None,
     cap_add: Optional[List[str]] = None,
-) -> Tuple[int, str, str]:
+) -> List[str]:
     docker_cmd = [DOCKER_CMD, "run", "--rm", "--init", "--cpus", "0.5", "--memory", "512m"]
     if network_mode:
         docker_cmd += ["--network", network_mode]
@@ -75,38 +389,364 @@ async def run_in_docker(
     if mounts:
         for host, cont in mounts:
             docker_cmd += ["-v", f"{host}:{cont}:ro"]
-    docker_cmd += [image] + cmd
+    return docker_cmd + [image] + cmd
+
+
+# stderr prefixes docker prints when an exec could not start (container gone, no sh in the
+# image, ...); exit codes are no signal here, the job's own 125/126/127 pass through the wrapper
+_DOCKER_EXEC_ERRORS = (b"Error response from daemon", b"OCI runtime exec failed")
+# per-process part of pooled container names: two servers on one Docker host never share
+# (or remove) each other's containers
+_DOCKER_POOL_OWNER = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+# run the job as a child of sh and record its pid, so a job whose `docker exec` client was killed
+# (timeout, stdout cap, cancellation) can be killed inside the long-lived container too
+_POOL_JOB_WRAPPER = '"$@" & echo $! > "/tmp/$0.pid"; wait $!; rc=$?; rm -f "/tmp/$0.pid"; exit $rc'
+_POOL_JOB_KILL = 'kill -KILL "$(cat "/tmp/$0.pid")" 2>/dev/null; rm -f "/tmp/$0.pid"'
+
+
+class DockerPool:
+    """
+    Keep one long-running container per (image, network_mode, cap_add) and run jobs in it
+    with `docker exec`, instead of paying `docker run --rm` container setup on every call.
+    Containers with no in-flight exec for `idle_ttl` seconds are removed, and all of them at exit.
+    The container's --cpus/--memory limits are shared by the jobs running in it at the same time.
+    """
+
+    def __init__(self, idle_ttl: int = DOCKER_POOL_IDLE_TTL):
+        self.idle_ttl = idle_ttl
+        self._containers: Dict[Tuple, str] = {}
+        # in-flight execs per container id; a retired container (dropped from _containers after
+        # a failed exec) is only removed once its last exec has finished
+        self._inflight: Dict[str, int] = {}
+        self._retired: set = set()
+        self._reapers: Dict[Tuple, asyncio.TimerHandle] = {}
+        self._locks: Dict[Tuple, asyncio.Lock] = {}
+        self._tasks: set = set()
+        atexit.register(self.close)
+
+    @staticmethod
+    def _key(image: str, network_mode: Optional[str], cap_add: Optional[List[str]]) -> Tuple:
+        return image, network_mode or "", tuple(sorted(c for c in (cap_add or []) if c))
+
+    @staticmethod
+    def _name(key: Tuple) -> str:
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=6).hexdigest()
+        return f"mcp-tool-{digest}-{_DOCKER_POOL_OWNER}"
+
+    async def _start(self, key: Tuple) -> Optional[str]:
+        image, network_mode, caps = key
+        cmd = [
+            DOCKER_CMD, "run", "-d", "--rm", "--init", "--name", self._name(key),
+            "--cpus", "0.5", "--memory", "512m",
+        ]
+        if network_mode:
+            cmd += ["--network", network_mode]
+        for cap in caps:
+            cmd += ["--cap-add", cap]
+        cmd += ["--entrypoint", "sleep", image, "infinity"]
+        rc, out, err, _ = await run_cmd_capture(cmd, timeout=60)
+        if rc != 0 or not out.strip():
+            log.warning("docker pool: cannot start container for %s: %s", image, err[:500].decode(errors="ignore"))
+            return None
+        return out.strip().decode()
+
+    async def _acquire(self, key: Tuple) -> Optional[str]:
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            cid = self._containers.get(key)
+            if cid is None:
+                cid = await self._start(key)
+                if cid is None:
+                    return None
+                self._containers[key] = cid
+            self._inflight[cid] = self._inflight.get(cid, 0) + 1
+            reaper = self._reapers.pop(key, None)
+            if reaper is not None:
+                reaper.cancel()
+            return cid
+
+    def _release(self, key: Tuple, cid: str) -> None:
+        self._inflight[cid] -= 1
+        if self._inflight[cid]:
+            return
+        del self._inflight[cid]
+        if cid in self._retired:
+            self._spawn(self._remove(cid))
+        elif self._containers.get(key) == cid:
+            loop = asyncio.get_running_loop()
+            self._reapers[key] = loop.call_later(self.idle_ttl, self._spawn_reap, key)
+
+    def _spawn(self, coro: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _spawn_reap(self, key: Tuple) -> None:
+        self._spawn(self._reap(key))
+
+    async def _reap(self, key: Tuple) -> None:
+        self._reapers.pop(key, None)
+        cid = self._containers.get(key)
+        if cid and not self._inflight.get(cid):
+            del self._containers[key]
+            await self._remove(cid)
+
+    def _retire(self, key: Tuple, cid: str) -> None:
+        """Stop handing out cid; it is removed now if idle, else when its last exec finishes."""
+        if self._containers.get(key) == cid:
+            del self._containers[key]
+        if self._inflight.get(cid):
+            self._retired.add(cid)
+        else:
+            self._spawn(self._remove(cid))
+
+    async def _remove(self, cid: str) -> None:
+        self._retired.discard(cid)
+        await run_cmd_capture([DOCKER_CMD, "rm", "-f", cid], timeout=30)
+
+    def close(self) -> None:
+        """Remove every pooled container (blocking); registered with atexit."""
+        cids = list(self._containers.values()) + list(self._retired)
+        self._containers.clear()
+        self._retired.clear()
+        for handle in self._reapers.values():
+            handle.cancel()
+        self._reapers.clear()
+        if not cids:
+            return
+        try:
+            subprocess.run([DOCKER_CMD, "rm", "-f", *cids], capture_output=True, timeout=30)
+        except (OSError, subprocess.SubprocessError):
+            log.warning("docker pool: cannot remove containers %s", ", ".join(c[:12] for c in cids))
+
+    async def _exec_with(
+        self,
+        image: str,
+        cmd: List[str],
+        runner: Callable[[List[str]], Awaitable[Tuple]],
+        network_mode: Optional[str] = None,
+        cap_add: Optional[List[str]] = None,
+    ) -> Optional[Tuple]:
+        if self.idle_ttl <= 0:
+            return None
+        key = self._key(image, network_mode, cap_add)
+        cid = await self._acquire(key)
+        if cid is None:
+            return None
+        job = uuid.uuid4().hex
+        res = None
+        try:
+            res = await runner([DOCKER_CMD, "exec", cid, "sh", "-c", _POOL_JOB_WRAPPER, job] + cmd)
+        finally:
+            # the exec client was killed or never returned normally: the job may still run in the container
+            if res is None or res[0] == -1 or (len(res) > 3 and res[3]):
+                await asyncio.shield(
+                    run_cmd_capture([DOCKER_CMD, "exec", cid, "sh", "-c", _POOL_JOB_KILL, job], timeout=30)
+                )
+            if res is not None and res[2].startswith(_DOCKER_EXEC_ERRORS):
+                # the job never started: stop using this container; the caller falls back to docker run
+                log.warning("docker pool: exec failed in %s (rc=%s), dropping container", cid[:12], res[0])
+                self._retire(key, cid)
+                res = None
+            self._release(key, cid)
+        # runners return (rc, stdout or consume result, stderr, ...)
+        return res
+
+    async def exec(
+        self,
+        image: str,
+        cmd: List[str],
+        timeout: int = 60,
+        network_mode: Optional[str] = None,
+        cap_add: Optional[List[str]] = None,
+    ) -> Optional[Tuple[int, bytes, bytes, bool]]:
+        """Run cmd in the pooled container for image. Returns None if the pool cannot serve it."""
+        return await self._exec_with(
+            image, cmd, lambda argv: run_cmd_capture(argv, timeout=timeout), network_mode, cap_add
+        )
+
+    async def exec_stream(
+        self,
+        image: str,
+        cmd: List[str],
+        consume: Callable[[asyncio.StreamReader], Awaitable[Any]],
+        timeout: int = 60,
+        network_mode: Optional[str] = None,
+        cap_add: Optional[List[str]] = None,
+    ) -> Optional[Tuple[int, Any, bytes, bool]]:
+        """Streaming variant of exec(); stdout goes to `consume` as in run_cmd_stream."""
+        return await self._exec_with(
+            image, cmd, lambda argv: run_cmd_stream(argv, consume, timeout=timeout), network_mode, cap_add
+        )
+
+
+DOCKER_POOL = DockerPool()
+
+
+async def run_in_docker(
+    image: str,
+    cmd: List[str],
+    mounts: Optional[List[Tuple[str, str]]] = None,
+    timeout: int = 60,
+    network_mode: Optional[str] = None,
+    cap_add: Optional[List[str]] = None,
+) -> Tuple[int, bytes, bytes, bool]:
+    # pooled containers are created without per-job mounts; jobs that need one get a fresh container
+    if not mounts:
+        res = await DOCKER_POOL.exec(image, cmd, timeout=timeout, network_mode=network_mode, cap_add=cap_add)
+        if res is not None:
+            return res
+    docker_cmd = build_docker_cmd(image, cmd, mounts=mounts, network_mode=network_mode, cap_add=cap_add)
     return await run_cmd_capture(docker_cmd, timeout=timeout)
 
 
-def parse_nmap_json(text: str) -> Dict[str, Any]:
+async def run_in_docker_stream(
+    image: str,
+    cmd: List[str],
+    consume: Callable[[asyncio.StreamReader], Awaitable[Any]],
+    mounts: Optional[List[Tuple[str, str]]] = None,
+    timeout: int = 60,
+    network_mode: Optional[str] = None,
+    cap_add: Optional[List[str]] = None,
+) -> Tuple[int, Any, bytes, bool]:
+    if not mounts:
+        res = await DOCKER_POOL.exec_stream(
+            image, cmd, consume, timeout=timeout, network_mode=network_mode, cap_add=cap_add
+        )
+        if res is not None:
+            return res
+    docker_cmd = build_docker_cmd(image, cmd, mounts=mounts, network_mode=network_mode, cap_add=cap_add)
+    return await run_cmd_stream(docker_cmd, consume, timeout=timeout)
+
+
+class _TeeReader:
+    """Async file-like adapter over a StreamReader, optionally copying every chunk to `sink`."""
+
+    def __init__(self, stream: asyncio.StreamReader, sink: Optional[IO[bytes]] = None):
+        self._stream = stream
+        self._sink = sink
+
+    async def read(self, n: int = 65536) -> bytes:
+        chunk = await self._stream.read(n)
+        if chunk and self._sink is not None:
+            self._sink.write(chunk)
+        return chunk
+
+
+async def iter_ffuf_results(
+    stream: asyncio.StreamReader, raw_path: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Incrementally parse `ffuf -json` output (one JSON record per line) and yield only
+    the fields the tools return, so memory stays bounded by a single record.
+    """
+    sink = open(raw_path, "wb") if raw_path else None
     try:
-        return json.loads(text)
-    except Exception:
-        s = text.strip()
-        start = s.find("{")
-        end = s.rfind("}")
+        async for item in ijson.items(_TeeReader(stream, sink), "", multiple_values=True):
+            if not isinstance(item, dict):
+                continue
+            yield {
+                "url": item.get("url"),
+                "status": item.get("status"),
+                "length": item.get("length"),
+                "words": item.get("words"),
+            }
+    except ijson.JSONError as e:
+        log.warning("ffuf output parse stopped: %s", e)
+    finally:
+        if sink is not None:
+            sink.close()
+
+
+def _nmap_host(el: ET.Element) -> Dict[str, Any]:
+    status = el.find("status")
+    host: Dict[str, Any] = {
+        "status": status.get("state") if status is not None else None,
+        "addresses": [{"addr": a.get("addr"), "type": a.get("addrtype")} for a in el.findall("address")],
+        "hostnames": [h.get("name") for h in el.findall("hostnames/hostname")],
+        "ports": [],
+    }
+    for port in el.findall("ports/port"):
+        state = port.find("state")
+        service = port.find("service")
+        host["ports"].append({
+            "protocol": port.get("protocol"),
+            "port": int(port.get("portid", 0)),
+            "state": state.get("state") if state is not None else None,
+            "service": {
+                k: service.get(k) for k in ("name", "product", "version", "extrainfo") if service.get(k)
+            } if service is not None else {},
+        })
+    return host
+
+
+async def collect_nmap_hosts(stream: asyncio.StreamReader) -> Dict[str, Any]:
+    """
+    Incrementally parse `nmap -oX -` output; each <host> element is converted and
+    released as soon as it is closed.
+    """
+    parser = ET.XMLPullParser(events=("end",))
+    hosts: List[Dict[str, Any]] = []
+    summary: Dict[str, Any] = {}
+    try:
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            for _, el in parser.read_events():
+                if el.tag == "host":
+                    hosts.append(_nmap_host(el))
+                    el.clear()
+                elif el.tag == "finished":
+                    summary = dict(el.attrib)
+        parser.close()
+    except ET.ParseError as e:
+        log.warning("nmap output parse stopped: %s", e)
+    return {"hosts": hosts, "summary": summary}
+
+
+def iter_line_chunks(data: bytes, size: int = PARSE_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Split output into ~size-byte pieces that end on a newline, so line-anchored regexes can
+    scan piecewise; re holds the GIL for a whole scan, chunks let other threads run in between.
+    """
+    start, n = 0, len(data)
+    while start < n:
+        end = data.find(b"\n", min(start + size, n) - 1)
+        end = n if end == -1 else end + 1
+        yield data[start:end]
+        start = end
+
+
+def parse_nmap_json(data: Union[str, bytes]) -> Dict[str, Any]:
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        s = data.strip()
+        start = s.find("{" if isinstance(s, str) else b"{")
+        end = s.rfind("}" if isinstance(s, str) else b"}")
         if start != -1 and end != -1 and end > start:
             try:
-                return json.loads(s[start:end+1])
-            except Exception:
+                return orjson.loads(s[start:end+1])
+            except orjson.JSONDecodeError:
                 pass
-    return {"raw": text}
+    return {"raw": data if isinstance(data, str) else data.decode(errors="ignore")}
 
 
-def parse_ffuf_json(text: str) -> Dict[str, Any]:
+def parse_ffuf_json(data: Union[str, bytes]) -> Dict[str, Any]:
     try:
-        return json.loads(text)
-    except Exception:
-        s = text.strip()
-        start = s.find("{")
-        end = s.rfind("}")
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        s = data.strip()
+        start = s.find("{" if isinstance(s, str) else b"{")
+        end = s.rfind("}" if isinstance(s, str) else b"}")
         if start != -1 and end != -1:
             try:
-                return json.loads(s[start:end+1])
-            except Exception:
+                return orjson.loads(s[start:end+1])
+            except orjson.JSONDecodeError:
                 pass
-    return {"raw": text}
+    return {"raw": data if isinstance(data, str) else data.decode(errors="ignore")}
 
 
 def build_nmap_cmd(target: str, ports: str = "1-1024", fast: bool = True, service_detection: bool = True) -> List[str]:
@@ -115,7 +755,7 @@ def build_nmap_cmd(target: str, ports: str = "1-1024", fast: bool = True, servic
         cmd += ["-sV"]
     if fast:
         cmd += ["-T4", "--min-rate", os.getenv("DEFAULT_MIN_RATE", "1000")]
-    cmd += ["-oJ", "-", "-p", ports, target]
+    cmd += ["-oX", "-", "-p", ports, target]
     return cmd
 
 